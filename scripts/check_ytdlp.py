@@ -4,6 +4,8 @@ import sys
 import json
 import logging
 import os
+import re
+import functools
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,6 +13,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger('ytdlp_checker')
 
+# Matches long option names such as --add-header in the help output
+_OPTION_RE = re.compile(r'--[a-z][a-z0-9-]+')
+
 def get_ytdlp_version():
     """Get the installed version of yt-dlp"""
     try:
@@ -22,6 +27,7 @@ def get_ytdlp_version():
         logger.warning(f"Could not determine yt-dlp version: {str(e)}")
         return "unknown"
 
+@functools.lru_cache(maxsize=1)
 def get_ytdlp_help():
     """Get the help output of yt-dlp to check supported options"""
     try:
@@ -31,10 +37,14 @@ def get_ytdlp_help():
         logger.error(f"Error getting yt-dlp help: {str(e)}")
         return ""
 
+@functools.lru_cache(maxsize=1)
+def get_supported_options():
+    """Parse the set of long options listed in the yt-dlp help output"""
+    return frozenset(_OPTION_RE.findall(get_ytdlp_help()))
+
 def check_option_support(option):
     """Check if a specific option is supported in the current yt-dlp version"""
-    help_text = get_ytdlp_help()
-    return option in help_text
+    return option in get_supported_options()
 
 def main():
     """Run compatibility checks and report findings"""
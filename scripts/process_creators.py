@@ -5,33 +5,143 @@ import subprocess
 import datetime
 import time
 import logging
+import logging.handlers
 import sys
+import atexit
+import signal
+import queue
 import re
-import fcntl
 import shutil
-import glob
+import errno
+import pathlib
+import tempfile
 import traceback
+import threading
+import functools
+import http.cookiejar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import mutagen.mp4
+import requests
+import yt_dlp
 
 # Set up logging
+log_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(log_format)
+file_handler = logging.FileHandler('/downloads/detailed_download.log')
+file_handler.setFormatter(log_format)
+# Buffer records for the detailed log in memory and write them in batches;
+# errors are flushed straight away
+memory_handler = logging.handlers.MemoryHandler(
+    capacity=1024,
+    flushLevel=logging.ERROR,
+    target=file_handler
+)
+# Worker threads only enqueue records; a listener thread formats and writes
+# them, so downloads never block on stdout or disk
+log_queue = queue.Queue(-1)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+# Only merge the message arguments here; the listener's handlers add the timestamp and level
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, stream_handler, memory_handler)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('/downloads/detailed_download.log')
-    ]
+    handlers=[queue_handler]
 )
 logger = logging.getLogger('patreon_downloader')
+log_listener.start()
+# Registered in reverse order: drain the queue first, then flush the buffer
+atexit.register(memory_handler.close)
+atexit.register(log_listener.stop)
+
+def _flush_logs_on_sigterm(signum, frame):
+    """Flush queued and buffered log records, then terminate as the default handler would"""
+    log_listener.stop()
+    memory_handler.flush()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+signal.signal(signal.SIGTERM, _flush_logs_on_sigterm)
+
+# Precompiled patterns used when cleaning names and parsing yt-dlp output
+_ID_SUFFIX_RE = re.compile(r'\s*\[[a-zA-Z0-9_-]+\](?=\.[a-zA-Z0-9]+$)')
+_MULTISPACE_RE = re.compile(r'\s+')
+_FOLDER_UNSAFE_RE = re.compile(r'[^\w\s-]|_')
+
+# File extensions recognized when grouping downloaded files
+_VIDEO_EXTS = frozenset({'.mp4', '.mkv', '.webm', '.mov', '.avi'})
+_THUMBNAIL_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.webp'})
+# Role of each kept file type in a video folder; anything else is an extra file
+_EXT_ROLE = {
+    **dict.fromkeys(_VIDEO_EXTS, 'video'),
+    **dict.fromkeys(_THUMBNAIL_EXTS, 'thumbnail'),
+}
+
+# Serializes read-modify-write cycles of the last scan times file
+_last_scan_lock = threading.Lock()
+
+class TokenBucket:
+    """Thread-safe token bucket shared by the workers to pace requests to patreon.com"""
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 def load_config():
     with open('/config/config.json', 'r') as f:
         return json.load(f)
 
-def make_non_blocking(fd):
-    """Make a file descriptor non-blocking"""
-    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
-    return fd
+def load_last_scans():
+    """Load the time each creator was last scanned successfully"""
+    try:
+        with open('/config/last_scan.json', 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def scanned_recently(creator):
+    """Check whether a creator was scanned successfully within its min_scan_interval_minutes"""
+    min_scan_interval = creator.get('min_scan_interval_minutes', 60)
+    last_scan = load_last_scans().get(creator['name'])
+    if not last_scan:
+        return False
+    
+    try:
+        last_scan_time = datetime.datetime.fromisoformat(last_scan)
+    except ValueError:
+        logger.warning(f"Ignoring invalid last scan time for {creator['name']}: {last_scan}")
+        return False
+    
+    if datetime.datetime.now() - last_scan_time < datetime.timedelta(minutes=min_scan_interval):
+        logger.info(f"Skipping {creator['name']}: last scanned at {last_scan}, less than {min_scan_interval} minutes ago")
+        return True
+    return False
+
+def record_last_scan(creator_name):
+    """Record a successful scan of a creator, atomically rewriting the file"""
+    with _last_scan_lock:
+        last_scans = load_last_scans()
+        last_scans[creator_name] = datetime.datetime.now().isoformat()
+        with open('/config/last_scan.json.tmp', 'w') as f:
+            json.dump(last_scans, f, indent=2)
+        os.replace('/config/last_scan.json.tmp', '/config/last_scan.json')
 
 def clean_filename(filename):
     """
@@ -39,83 +149,24 @@ def clean_filename(filename):
     excessive spaces, and special characters
     """
     # Remove [id] pattern that yt-dlp adds
-    cleaned = re.sub(r'\s*\[[a-zA-Z0-9_-]+\](?=\.[a-zA-Z0-9]+$)', '', filename)
+    cleaned = _ID_SUFFIX_RE.sub('', filename)
     
     # Replace multiple spaces with single space
-    cleaned = re.sub(r'\s+', ' ', cleaned)
+    cleaned = _MULTISPACE_RE.sub(' ', cleaned)
     
     # Trim spaces at beginning and end
     cleaned = cleaned.strip()
     
     return cleaned
 
-def add_metadata_to_video(video_file, info_json_file, description_file):
-    """Add metadata from the description and info JSON to the video file"""
-    if not os.path.exists(video_file) or not os.path.exists(info_json_file):
-        logger.warning(f"Missing files needed for metadata: {video_file} or {info_json_file}")
-        return False
-    
-    # Load info JSON
-    try:
-        with open(info_json_file, 'r', encoding='utf-8') as f:
-            info = json.load(f)
-        
-        # Extract metadata
-        title = info.get('title', '')
-        upload_date = info.get('upload_date', '')
-        uploader = info.get('uploader', '')
-        
-        # Get description from description file if available
-        description = ""
-        if os.path.exists(description_file):
-            with open(description_file, 'r', encoding='utf-8') as f:
-                description = f.read()
-        
-        # Build FFmpeg metadata arguments
-        metadata_args = [
-            'ffmpeg',
-            '-i', video_file,
-            '-c', 'copy',
-            '-metadata', f'title={title}',
-            '-metadata', f'author={uploader}',
-            '-metadata', f'date={upload_date}',
-            '-metadata', f'description={description}',
-            f'{video_file}.temp'
-        ]
-        
-        # Run FFmpeg to add metadata
-        logger.info(f"Adding metadata to {os.path.basename(video_file)}")
-        subprocess.run(metadata_args, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Replace original file with the one containing metadata
-        os.remove(video_file)
-        os.rename(f'{video_file}.temp', video_file)
-        
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error adding metadata: {str(e)}")
-        # Clean up temp file if it exists
-        if os.path.exists(f'{video_file}.temp'):
-            os.remove(f'{video_file}.temp')
-        return False
-
 def sanitize_folder_name(name):
     """Create a clean folder name with no special characters"""
-    # First, replace underscores with spaces
-    cleaned = name.replace('_', ' ')
-    
-    # Remove special characters and replace with spaces
-    cleaned = re.sub(r'[^\w\s-]', ' ', cleaned)
+    # Replace underscores and special characters with spaces in one pass
+    cleaned = _FOLDER_UNSAFE_RE.sub(' ', name)
     
-    # Replace multiple spaces with single space
-    cleaned = re.sub(r'\s+', ' ', cleaned)
-    
-    # Trim spaces at beginning and end
-    cleaned = cleaned.strip()
-    
-    # Format titles nicely - capitalize first letter of each word
-    cleaned = ' '.join(word.capitalize() for word in cleaned.split())
+    # Format titles nicely - capitalize first letter of each word; split() also
+    # collapses repeated whitespace and trims both ends
+    cleaned = ' '.join(map(str.capitalize, cleaned.split()))
     
     # Limit length to avoid path issues
     if len(cleaned) > 80:
@@ -126,111 +177,134 @@ def sanitize_folder_name(name):
     
     return cleaned
 
-def clean_up_files(download_dir, creator_name):
+def move_file(src, dst):
+    """
+    Move a file with an atomic rename, replacing any existing destination.
+    Falls back to a copy only when src and dst are on different filesystems
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
+def clean_up_files(creator_dir):
     """
     Clean up downloaded files:
     1. Create a dedicated folder for each video
-    2. Add metadata from info files
-    3. Keep thumbnails but remove other auxiliary files
+    2. Keep thumbnails but remove other auxiliary files
+    
+    Metadata is written in place by MutagenMetadataPP during download,
+    so no extra remux pass is needed here.
     """
-    creator_dir = os.path.join(download_dir, creator_name)
     logger.info(f"Cleaning up files in {creator_dir}")
     
     # Group files by base name (without extension)
     file_groups = {}
     
-    for file_path in glob.glob(os.path.join(creator_dir, '*')):
-        if os.path.isfile(file_path):
-            # Extract base name without extension and potential [id] suffix
-            base_name = os.path.basename(file_path)
-            # Match pattern like "Name [id].ext"
-            match = re.match(r'(.+?)(\s*\[[a-zA-Z0-9_-]+\])(\.[a-zA-Z0-9]+)$', base_name)
+    with os.scandir(creator_dir) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
             
-            if match:
-                name_without_id = match.group(1)
-                id_part = match.group(2)
-                extension = match.group(3)
-                
-                # Group files by their name without id
-                if name_without_id not in file_groups:
-                    file_groups[name_without_id] = {'id': id_part, 'files': []}
-                
-                file_groups[name_without_id]['files'].append((file_path, extension))
+            # Split names like "Name [id].ext"; everything after the id is the
+            # extension, so double extensions like .info.json come out whole
+            name_without_id, sep, rest = entry.name.rpartition(' [')
+            id_end = rest.find(']')
+            if not sep or id_end == -1:
+                continue
+            
+            id_part = sep + rest[:id_end + 1]
+            extension = rest[id_end + 1:].lower()
+            
+            # Group files by their name without id
+            if name_without_id not in file_groups:
+                file_groups[name_without_id] = {'id': id_part, 'files': []}
+            
+            file_groups[name_without_id]['files'].append((entry, extension))
     
     # Process each group of files
     for base_name, group in file_groups.items():
-        video_file = None
-        info_json_file = None
-        description_file = None
-        thumbnail_file = None
-        other_files = []
+        files_by_role = {}
+        extra_files = []
         
         # Identify different file types
-        for file_path, ext in group['files']:
-            if ext.lower() in ['.mp4', '.mkv', '.webm', '.mov', '.avi']:
-                video_file = file_path
-            elif ext.lower() == '.info.json':
-                info_json_file = file_path
-            elif ext.lower() == '.description':
-                description_file = file_path
-            elif ext.lower() in ['.jpg', '.jpeg', '.png', '.webp']:
-                thumbnail_file = file_path
+        for entry, ext in group['files']:
+            role = _EXT_ROLE.get(ext)
+            if role:
+                files_by_role[role] = (entry, ext)
             else:
-                other_files.append(file_path)
+                # .info.json, .description and any other auxiliary files
+                extra_files.append(entry)
+        
+        video = files_by_role.get('video')
+        thumbnail = files_by_role.get('thumbnail')
         
         # Only proceed if we have a video file
-        if video_file:
+        if video:
             # Create clean folder name from video title
             clean_title = sanitize_folder_name(base_name)
-            video_folder = os.path.join(creator_dir, clean_title)
+            video_folder = creator_dir / clean_title
             
             # Create folder if it doesn't exist
-            os.makedirs(video_folder, exist_ok=True)
-            
-            # Get video extension
-            video_ext = os.path.splitext(video_file)[1]
-            new_video_path = os.path.join(video_folder, f"video{video_ext}")
+            video_folder.mkdir(exist_ok=True)
             
-            # Add metadata if we have the necessary files
-            if info_json_file:
-                add_metadata_to_video(video_file, info_json_file, description_file)
-            
-            # Move the video file to its new location
+            # Move the video file to its new location, reusing the extension parsed while grouping
+            video_entry, video_ext = video
+            new_video_path = video_folder / f"video{video_ext}"
             logger.info(f"Moving video to {new_video_path}")
-            shutil.move(video_file, new_video_path)
+            move_file(video_entry.path, new_video_path)
             
             # Move the thumbnail file if we have one
-            if thumbnail_file:
-                thumb_ext = os.path.splitext(thumbnail_file)[1]
-                new_thumb_path = os.path.join(video_folder, f"thumbnail{thumb_ext}")
+            if thumbnail:
+                thumb_entry, thumb_ext = thumbnail
+                new_thumb_path = video_folder / f"thumbnail{thumb_ext}"
                 logger.info(f"Moving thumbnail to {new_thumb_path}")
-                shutil.move(thumbnail_file, new_thumb_path)
+                move_file(thumb_entry.path, new_thumb_path)
             
-            # Delete other files
-            for file_to_delete in [info_json_file, description_file] + other_files:
-                if file_to_delete and os.path.exists(file_to_delete):
-                    logger.debug(f"Deleting extra file: {os.path.basename(file_to_delete)}")
-                    os.remove(file_to_delete)
+            # Delete other files; they were just listed by scandir, so no existence check is needed
+            for entry in extra_files:
+                logger.debug(f"Deleting extra file: {entry.name}")
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
 
 def verify_downloads(creator_dir):
-    """Verify that video files were actually downloaded"""
-    video_files = []
-    for ext in ['.mp4', '.mkv', '.webm', '.mov', '.avi']:
-        video_files.extend(glob.glob(os.path.join(creator_dir, f'*{ext}')))
+    """Check whether the creator folder holds downloaded videos that still need cleaning up"""
+    with os.scandir(creator_dir) as entries:
+        video_files = [
+            entry.name for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in _VIDEO_EXTS
+        ]
     
     if not video_files:
-        logger.warning(f"No video files found in {creator_dir}, only thumbnails/images may have been downloaded")
         return False
     
     logger.info(f"Found {len(video_files)} video files in {creator_dir}")
     return True
 
-def attempt_alternative_download(creator, cookies_file, download_dir):
+def copy_cookies(cookies_file):
+    """
+    Copy the cookies file to a private temp file for one worker. yt-dlp
+    saves its cookie jar back to the file it loaded whenever it closes,
+    so workers sharing cookies.txt would truncate it under each other
+    """
+    fd, worker_cookies_file = tempfile.mkstemp(prefix='cookies_', suffix='.txt')
+    os.close(fd)
+    try:
+        shutil.copyfile(cookies_file, worker_cookies_file)
+    except FileNotFoundError:
+        # Leave the copy empty; download_creator reports the missing cookies file
+        pass
+    return worker_cookies_file
+
+def attempt_alternative_download(creator, creator_dir, cookies_file, download_dir):
     """Try alternative download methods if standard method fails"""
     creator_name = creator['name']
-    creator_dir = os.path.join(download_dir, creator_name)
     creator_url = f"https://www.patreon.com/{creator_name}/posts"
-    output_template = os.path.join(creator_dir, 'alt_download_%(title)s.%(ext)s')
+    output_template = str(creator_dir / 'alt_download_%(title)s.%(ext)s')
     
     logger.info(f"Attempting alternative download method for {creator_name}")
     
@@ -250,9 +324,11 @@ def attempt_alternative_download(creator, cookies_file, download_dir):
         # Add timeout to prevent freezing
         diagnostic_output = subprocess.run(
             alternative_cmd, 
+            stdin=subprocess.DEVNULL,  # Never let the child read from the controlling terminal
             capture_output=True, 
             text=True, 
             check=False,
+            start_new_session=True,  # Keep a Ctrl-C aimed at this script from interrupting the child
             timeout=60  # 60 second timeout to prevent hanging
         )
         
@@ -278,45 +354,210 @@ def attempt_alternative_download(creator, cookies_file, download_dir):
         logger.error(f"Error during alternative download attempt: {str(e)}")
         return False
 
+@functools.lru_cache(maxsize=1)
+def get_precheck_session(cookies_file):
+    """Build one requests session with the Patreon cookies, shared by all workers"""
+    cookie_jar = http.cookiejar.MozillaCookieJar(cookies_file)
+    cookie_jar.load(ignore_discard=True, ignore_expires=True)
+    
+    session = requests.Session()
+    session.cookies = cookie_jar
+    # Send the same browser headers and referer as the yt-dlp download
+    session.headers.update(yt_dlp.utils.networking.std_headers)
+    session.headers['Referer'] = 'https://www.patreon.com/'
+    return session
+
+def is_cloudflare_challenge(response):
+    """
+    Check whether a response is a Cloudflare bot challenge. Every patreon.com
+    response carries Server: cloudflare, so only cf-mitigated tells them apart
+    """
+    return response.headers.get('cf-mitigated', '').lower() == 'challenge'
+
+def precheck_creator(creator_name, cookies_file):
+    """
+    Detect missing creators and rejected cookies with a single HEAD request
+    before running yt-dlp. Returns False for a 404, or for a 401/403 that
+    isn't a Cloudflare challenge (cf-mitigated: challenge); a challenge, any
+    other status or a failed request lets yt-dlp try the download as usual
+    """
+    creator_url = f"https://www.patreon.com/{creator_name}/posts"
+    
+    try:
+        session = get_precheck_session(cookies_file)
+        response = session.head(creator_url, allow_redirects=True, timeout=10)
+    except (http.cookiejar.LoadError, OSError) as e:
+        # requests exceptions are OSErrors too; never block a download on the pre-check itself
+        logger.warning(f"Skipping pre-check for {creator_name}: {str(e)}")
+        return True
+    
+    if response.status_code == 404:
+        logger.error(f"Content not found for {creator_name}. The URL might be incorrect or content removed.")
+        return False
+    
+    if response.status_code in (401, 403):
+        # Cloudflare commonly challenges non-browser clients and HEAD requests with a 403
+        if is_cloudflare_challenge(response):
+            logger.info(f"Pre-check for {creator_name} got a Cloudflare challenge (HTTP {response.status_code}), letting yt-dlp try")
+            return True
+        
+        if response.status_code == 401:
+            logger.error(f"Authentication failed for {creator_name}. Please check your cookies.txt file.")
+        else:
+            logger.error(f"Access forbidden for {creator_name}. You may not have access to this content or your cookies expired.")
+        return False
+    
+    return True
+
+@functools.lru_cache(maxsize=1)
 def get_ytdlp_version():
     """Get the installed version of yt-dlp"""
     try:
-        result = subprocess.run(['yt-dlp', '--version'], capture_output=True, text=True, check=True)
-        version = result.stdout.strip()
+        # Read the version from the imported package rather than spawning `yt-dlp --version`
+        version = yt_dlp.version.__version__
         logger.info(f"Using yt-dlp version: {version}")
         return version
     except Exception as e:
         logger.warning(f"Could not determine yt-dlp version: {str(e)}")
         return "unknown"
 
-def download_creator(creator, archive_file, cookies_file, download_dir):
-    """Download content from a specific creator"""
+class CreatorYtdlpLogger:
+    """
+    Logger passed to yt-dlp for a single creator. Routes yt-dlp's messages
+    into this script's logging, records error lines and counts new downloads
+    """
+    
+    def __init__(self, creator_name, error_log):
+        self.creator_name = creator_name
+        self.error_log = error_log
+        self.error_lines = []
+        self.new_downloads = 0
+        self.progress_file = None
+        self.last_logged_decile = -1
+    
+    def debug(self, msg):
+        # yt-dlp passes both info and debug messages here
+        self._handle(msg)
+    
+    info = debug
+    
+    def warning(self, msg):
+        self._handle(f"WARNING: {msg}")
+    
+    def error(self, msg):
+        # Error messages already carry the "ERROR:" prefix
+        self._handle(msg)
+    
+    def _handle(self, msg):
+        try:
+            for line in msg.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                
+                # Capture error lines for detailed reporting
+                if 'ERROR:' in line or 'error:' in line.lower() or 'warning:' in line.lower():
+                    self.error_lines.append(line)
+                    logger.error(f"{self.creator_name}: {line}")
+                    self.error_log.write(f"{datetime.datetime.now()} - {line}\n")
+                elif line.startswith('[download]'):
+                    if 'Destination:' in line:
+                        self.new_downloads += 1
+                    logger.info(f"{self.creator_name}: {line}")
+                elif '[info]' in line or 'has already been downloaded' in line or 'Downloading page' in line:
+                    logger.info(f"{self.creator_name}: {line}")
+                else:
+                    logger.debug(f"{self.creator_name}: {line}")
+        except Exception as e:
+            # Never let a logging problem abort the download
+            logger.error(f"Error processing output for {self.creator_name}: {str(e)}")
+            logger.error(traceback.format_exc())
+    
+    def progress_hook(self, d):
+        """Log download progress at every 10% milestone of each file"""
+        if d.get('status') != 'downloading':
+            return
+        
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if not total_bytes:
+            return
+        
+        filename = d.get('filename', '')
+        if filename != self.progress_file:
+            self.progress_file = filename
+            self.last_logged_decile = -1
+        
+        percent = d.get('downloaded_bytes', 0) * 100 / total_bytes
+        decile = int(percent) // 10
+        if decile != self.last_logged_decile:
+            message = f"[download] {percent:5.1f}% of {yt_dlp.utils.format_bytes(total_bytes)}"
+            if d.get('speed'):
+                message += f" at {yt_dlp.utils.format_bytes(d['speed'])}/s"
+            if d.get('eta') is not None:
+                message += f" ETA {d['eta']}s"
+            logger.info(f"{self.creator_name}: {message} - {os.path.basename(filename)}")
+            self.last_logged_decile = decile
+
+class MutagenMetadataPP(yt_dlp.postprocessor.PostProcessor):
+    """
+    Tag each finished MP4 in place with mutagen. Only the moov atom is
+    rewritten, so the cost follows the size of the tags rather than the
+    size of the video as an ffmpeg -c copy remux would
+    """
+    
+    # MP4 atoms for the same title/author/date/description fields the old ffmpeg remux wrote
+    TAGS = {
+        '\xa9nam': 'title',
+        '\xa9ART': 'uploader',
+        '\xa9day': 'upload_date',
+        'desc': 'description',
+    }
+    
+    def run(self, info):
+        filepath = info['filepath']
+        if os.path.splitext(filepath)[1].lower() not in ('.mp4', '.m4v', '.mov'):
+            return [], info
+        
+        try:
+            video = mutagen.mp4.MP4(filepath)
+            for atom, field in self.TAGS.items():
+                if info.get(field):
+                    video[atom] = [str(info[field])]
+            video.save()
+        except mutagen.MutagenError as e:
+            self.report_warning(f"Could not add metadata to {os.path.basename(filepath)}: {str(e)}")
+        return [], info
+
+def download_creator(creator, creator_dir, archive_file, cookies_file, worker_cookies_file, download_dir):
+    """
+    Download content from a specific creator
+    
+    cookies_file is only read by the pre-check; yt-dlp gets worker_cookies_file,
+    this worker's private copy of it, since it writes the cookies back on exit.
+    Returns a (success, new_downloads) tuple, where new_downloads counts the
+    files yt-dlp started writing during this run
+    """
     
     creator_url = f"https://www.patreon.com/{creator['name']}/posts"
-    output_template = os.path.join(download_dir, creator['name'], '%(title)s [%(id)s].%(ext)s')
+    output_template = str(creator_dir / '%(title)s [%(id)s].%(ext)s')
     
     days_back = creator.get('days_back', 30)
     date_after = (datetime.datetime.now() - datetime.timedelta(days=days_back)).strftime("%Y%m%d")
     
     logger.info(f"Processing creator: {creator['name']} (looking back {days_back} days)")
     
-    # Check yt-dlp version to determine which options are supported
-    ytdlp_version = get_ytdlp_version()
-    
-    # Modify yt-dlp command to better handle Patreon videos
-    cmd = [
-        'yt-dlp',
-        '--cookies', cookies_file,
+    # yt-dlp options, written as command-line arguments so custom ytdlp_args can be appended
+    args = [
+        '--cookies', worker_cookies_file,
         '--download-archive', archive_file,
         '--dateafter', date_after,
         '-o', output_template,
-        '--write-info-json',
-        '--write-description',
         '--write-thumbnail',
+        # Keep the moov atom at the end of merged files so MutagenMetadataPP can grow it
+        # without shifting the video data
+        '--postprocessor-args', 'Merger+ffmpeg_o:-movflags -faststart',
         '--restrict-filenames',
-        '--progress',               # Show download progress
-        '--newline',                # Each progress line on new line for better log readability
-        '--verbose',                # Add verbose output for better error diagnostics
+        '--no-progress',            # Progress is reported through a progress hook instead
         # Use better format selection instead of just 'best'
         '-f', 'bestvideo+bestaudio/best', # Try to get best video+audio separately and merge, fall back to best combined format
         '--merge-output-format', 'mp4', # Try to merge formats to mp4
@@ -326,26 +567,21 @@ def download_creator(creator, archive_file, cookies_file, download_dir):
         '--no-overwrites',          # Don't overwrite files
         '--no-playlist',            # Treat as single post, not playlist
         '--playlist-end', '10',     # Limit to the 10 most recent posts
-        creator_url
     ]
     
     # Remove problematic extract-audio option - by default yt-dlp will NOT extract audio only
     # if ytdlp_version != "unknown" and not ytdlp_version.startswith("2021"):
-    #     cmd.extend(['--no-extract-audio'])  # This option is not supported
+    #     args.extend(['--no-extract-audio'])  # This option is not supported
     
     # Add any custom yt-dlp arguments if specified
     if 'ytdlp_args' in creator:
         logger.info(f"Using custom arguments for {creator['name']}: {creator['ytdlp_args']}")
-        ytdlp_args = creator['ytdlp_args'].split()
-        
-        # Don't duplicate verbose flag if it's already specified in custom args
-        if '--verbose' in ytdlp_args and '--verbose' in cmd:
-            cmd.remove('--verbose')
-            
-        cmd.extend(ytdlp_args)
+        # Verbose output is always turned on after parsing, see below
+        args.extend(arg for arg in creator['ytdlp_args'].split() if arg not in ('-v', '--verbose'))
     
+    command = ' '.join(['yt-dlp', '--verbose'] + args + [creator_url])
     logger.info(f"Starting download for {creator['name']}")
-    logger.info(f"Command: {' '.join(cmd)}")
+    logger.info(f"Command: {command}")
     
     # Create a log file specifically for this creator's errors
     error_log_path = os.path.join(download_dir, 'logs', f"{creator['name']}_errors.log")
@@ -356,113 +592,49 @@ def download_creator(creator, archive_file, cookies_file, download_dir):
         logger.error(f"Cookies file is missing or empty: {cookies_file}")
         with open(error_log_path, 'a') as f:
             f.write(f"{datetime.datetime.now()} - ERROR: Cookies file is missing or empty\n")
-        return False
+        return False, 0
     
-    # Check archive file access
-    try:
-        with open(archive_file, 'a') as f:
-            pass  # Just testing we can write to it
-    except Exception as e:
-        logger.error(f"Cannot write to archive file: {str(e)}")
+    # Catch expired cookies or a wrong creator name without starting yt-dlp
+    if not precheck_creator(creator['name'], cookies_file):
         with open(error_log_path, 'a') as f:
-            f.write(f"{datetime.datetime.now()} - ERROR: Cannot write to archive file: {str(e)}\n")
-        return False
+            f.write(f"{datetime.datetime.now()} - ERROR: Pre-check of {creator_url} failed, skipping download\n")
+        return False, 0
     
-    # Use Popen instead of run to capture output in real-time
-    process = subprocess.Popen(
-        cmd, 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1
-    )
-    
-    # Make stdout non-blocking
-    make_non_blocking(process.stdout.fileno())
-    
-    # Variables to track progress
-    last_logged_percent = -1
-    progress_pattern = re.compile(r'\[download\].*?(\d+\.\d)%')
-    last_update_time = time.time()
-    buffer = ""
-    error_lines = []
-    
-    # Continue until process exits
-    while process.poll() is None:
-        try:
-            # Try to read a chunk of output
-            chunk = process.stdout.read(4096)
-            if chunk:
-                buffer += chunk
-                lines = buffer.split('\n')
-                buffer = lines.pop()  # Keep the last incomplete line in the buffer
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Capture error lines for detailed reporting
-                    if 'ERROR:' in line or 'error:' in line.lower() or 'warning:' in line.lower():
-                        error_lines.append(line)
-                        logger.error(f"{creator['name']}: {line}")
-                        with open(error_log_path, 'a') as f:
-                            f.write(f"{datetime.datetime.now()} - {line}\n")
-                    
-                    # Always log download progress lines but throttle percentage updates
-                    elif line.startswith('[download]'):
-                        current_time = time.time()
-                        # Log important download messages immediately
-                        if 'Destination:' in line or 'has already been downloaded' in line or 'Resuming download' in line:
-                            logger.info(f"{creator['name']}: {line}")
-                        # Handle progress lines with percentage - limit update frequency
-                        elif '%' in line and (current_time - last_update_time >= 1.0):  # Max 1 update per second
-                            match = progress_pattern.match(line)
-                            if match:
-                                current_percent = float(match.group(1))
-                                logger.info(f"{creator['name']}: {line}")
-                                last_logged_percent = current_percent
-                                last_update_time = current_time
-                    elif '[info]' in line:
-                        logger.info(f"{creator['name']}: {line}")
-                    elif 'has already been downloaded' in line:
-                        logger.info(f"{creator['name']}: {line}")
-                    elif 'Downloading page' in line:
-                        logger.info(f"{creator['name']}: {line}")
-                    else:
-                        logger.debug(f"{creator['name']}: {line}")
-        except (IOError, BlockingIOError):
-            # No data available right now
-            pass
-        except Exception as e:
-            # Log other exceptions during output processing
-            logger.error(f"Error processing output for {creator['name']}: {str(e)}")
-            logger.error(traceback.format_exc())
-        
-        time.sleep(0.1)  # Small sleep to prevent CPU hogging
-    
-    # Process any remaining output
+    # Translate the arguments exactly as the yt-dlp command line would
     try:
-        remaining = process.stdout.read()
-        if remaining:
-            for line in remaining.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # Capture error lines for detailed reporting
-                if 'ERROR:' in line or 'error:' in line.lower() or 'warning:' in line.lower():
-                    error_lines.append(line)
-                    logger.error(f"{creator['name']}: {line}")
-                    with open(error_log_path, 'a') as f:
-                        f.write(f"{datetime.datetime.now()} - {line}\n")
-                else:
-                    logger.info(f"{creator['name']}: {line}")
-    except Exception as e:
-        logger.error(f"Error processing final output for {creator['name']}: {str(e)}")
-    
-    process.stdout.close()
-    return_code = process.wait()
+        ydl_opts = yt_dlp.parse_options(args).ydl_opts
+    except SystemExit:
+        # optparse exits on invalid arguments instead of raising
+        logger.error(f"Invalid yt-dlp arguments for {creator['name']}: {' '.join(args)}")
+        with open(error_log_path, 'a') as f:
+            f.write(f"{datetime.datetime.now()} - ERROR: Invalid yt-dlp arguments: {' '.join(args)}\n")
+        return False, 0
+    
+    # Add verbose output for better error diagnostics. Set here rather than passed as --verbose,
+    # which makes parse_options print its config debug lines straight to stderr
+    ydl_opts['verbose'] = True
+    
+    # Keep the error log open (line-buffered) for the whole download
+    with open(error_log_path, 'a', buffering=1) as error_log:
+        ytdlp_logger = CreatorYtdlpLogger(creator['name'], error_log)
+        ydl_opts['logger'] = ytdlp_logger
+        ydl_opts['progress_hooks'] = [ytdlp_logger.progress_hook]
+        
+        # Run yt-dlp in-process, avoiding interpreter startup and extractor imports per creator
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # Runs before yt-dlp records the archive entry, so no archived video is left untagged
+                ydl.add_post_processor(MutagenMetadataPP(ydl), when='post_process')
+                return_code = ydl.download([creator_url])
+        except yt_dlp.utils.YoutubeDLError as e:
+            # DownloadError has already been reported through ytdlp_logger; others
+            # (e.g. CookieLoadError for a malformed cookies.txt) have not
+            if not isinstance(e, yt_dlp.utils.DownloadError):
+                ytdlp_logger.error(f"ERROR: {str(e)}")
+            return_code = 1
+    
+    error_lines = ytdlp_logger.error_lines
+    new_downloads = ytdlp_logger.new_downloads
     
     # Check if all errors are just "No supported media" errors, which are normal for text-only posts
     media_not_found_errors = [line for line in error_lines if "No supported media found in this post" in line]
@@ -490,24 +662,66 @@ def download_creator(creator, archive_file, cookies_file, download_dir):
             f.write(f"\n===== ERROR SUMMARY =====\n")
             f.write(f"Time: {datetime.datetime.now()}\n")
             f.write(f"Return code: {return_code}\n")
-            f.write(f"Command: {' '.join(cmd)}\n")
+            f.write(f"Command: {command}\n")
             f.write(f"Error details:\n")
             for line in error_lines:
                 f.write(f"  {line}\n")
         
         # Add diagnostic attempt
         logger.info(f"Running diagnostics for {creator['name']} to determine cause of failure")
-        attempt_alternative_download(creator, cookies_file, download_dir)
+        attempt_alternative_download(creator, creator_dir, worker_cookies_file, download_dir)
         
-        return False
+        return False, new_downloads
     elif media_not_found_errors and return_code != 0:
         # We only had "No supported media" errors, which is normal for text-only posts
         logger.info(f"No downloadable media found in {len(media_not_found_errors)} posts for {creator['name']}")
         logger.info(f"This is normal for text-only posts without attachments")
-        return True
+        record_last_scan(creator['name'])
+        return True, new_downloads
     else:
         logger.info(f"Successfully completed processing {creator['name']}")
+        record_last_scan(creator['name'])
+        return True, new_downloads
+
+def process_creator(creator, archive_file, cookies_file, download_dir, rate_limiter):
+    """Download, verify and clean up a single creator; runs inside a worker thread"""
+    # Create creator directory if it doesn't exist
+    creator_dir = pathlib.Path(download_dir, creator['name'])
+    creator_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Skip before taking a rate limiter slot so no-op creators cost nothing
+    if scanned_recently(creator):
         return True
+    
+    # Space out creator starts across all workers to avoid Patreon rate limiting
+    if rate_limiter:
+        rate_limiter.acquire()
+    logger.info(f"Starting download process for creator: {creator['name']}")
+    # All workers share one archive; yt-dlp locks the file for each entry it appends
+    worker_cookies_file = copy_cookies(cookies_file)
+    try:
+        download_success, new_downloads = download_creator(creator, creator_dir, archive_file, cookies_file, worker_cookies_file, download_dir)
+    finally:
+        os.remove(worker_cookies_file)
+    
+    if download_success:
+        # Organized videos live in subfolders, so any video in the creator folder itself still
+        # needs cleaning up, including one left by an interrupted run that was already archived
+        if verify_downloads(creator_dir):
+            logger.info(f"Cleaning up files for creator: {creator['name']}")
+            clean_up_files(creator_dir)
+        # Verify that video files were downloaded, not just thumbnails
+        elif new_downloads:
+            logger.warning(f"No video files found in {creator_dir}, only thumbnails/images may have been downloaded")
+            logger.warning(f"Only non-video files were downloaded for {creator['name']}. This might indicate:")
+            logger.warning("1. The Patreon posts don't contain videos")
+            logger.warning("2. Authentication/cookies issues preventing access to video content")
+            logger.warning("3. Patreon may have changed their site structure")
+            logger.warning("Try manually visiting the creator's page to verify content type")
+        else:
+            logger.info(f"No new downloads for {creator['name']}, nothing to clean up")
+    
+    return download_success
 
 def main():
     try:
@@ -518,43 +732,37 @@ def main():
         cookies_file = '/config/cookies.txt'
         download_dir = '/downloads'
         
-        # Create archive file if it doesn't exist
-        if not os.path.exists(archive_file):
-            with open(archive_file, 'w') as f:
-                pass
-            logger.info(f"Created new archive file at {archive_file}")
+        # Create archive file if it doesn't exist, without truncating an existing one
+        pathlib.Path(archive_file).touch(exist_ok=True)
+        # yt-dlp only reports an unwritable archive after each finished video, which then gets
+        # downloaded again on every run, so check once before starting any creator
+        if not os.access(archive_file, os.W_OK):
+            logger.critical(f"Cannot write to archive file: {archive_file}")
+            return
+        
+        # Check yt-dlp version once per run rather than once per creator
+        get_ytdlp_version()
         
         logger.info(f"Found {len(config['creators'])} creators to process")
         
-        for creator in config['creators']:
-            try:
-                # Create creator directory if it doesn't exist
-                creator_dir = os.path.join(download_dir, creator['name'])
-                os.makedirs(creator_dir, exist_ok=True)
-                
-                logger.info(f"Starting download process for creator: {creator['name']}")
-                download_success = download_creator(creator, archive_file, cookies_file, download_dir)
-                
-                # Verify that video files were downloaded, not just thumbnails
-                if download_success:
-                    video_files_found = verify_downloads(creator_dir)
-                    if not video_files_found:
-                        logger.warning(f"Only non-video files were downloaded for {creator['name']}. This might indicate:")
-                        logger.warning("1. The Patreon posts don't contain videos")
-                        logger.warning("2. Authentication/cookies issues preventing access to video content")
-                        logger.warning("3. Patreon may have changed their site structure")
-                        logger.warning("Try manually visiting the creator's page to verify content type")
-                    else:
-                        logger.info(f"Cleaning up files for creator: {creator['name']}")
-                        clean_up_files(download_dir, creator['name'])
-                
-                # Add a small delay between creators to avoid rate limiting
-                delay = 10
-                logger.info(f"Waiting {delay} seconds before processing next creator...")
-                time.sleep(delay)
-                
-            except Exception as e:
-                logger.error(f"Error processing creator {creator['name']}: {str(e)}", exc_info=True)
+        max_workers = config.get('max_workers', 4)
+        start_interval = config.get('creator_start_interval', 10)
+        logger.info(f"Processing up to {max_workers} creators in parallel, starting one every {start_interval} seconds")
+        rate_limiter = TokenBucket(rate=1 / start_interval) if start_interval > 0 else None
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_creator, creator, archive_file, cookies_file, download_dir, rate_limiter): creator
+                for creator in config['creators']
+            }
+            
+            for future in as_completed(futures):
+                creator = futures[future]
+                try:
+                    future.result()
+                    logger.info(f"Finished processing creator: {creator['name']}")
+                except Exception as e:
+                    logger.error(f"Error processing creator {creator['name']}: {str(e)}", exc_info=True)
         
         logger.info("=== Patreon download process completed ===")
     